@@ -10,6 +10,16 @@ with open(os.path.join("src/peakrdl_opentitan", "__about__.py"), encoding='utf-8
     exec(f.read(), v_dict)
     version = v_dict['__version__']
 
+# Opt-in native build of the importer with mypyc.
+# The pure-Python package is installed otherwise.
+ext_modules = []
+if os.environ.get("PEAKRDL_OPENTITAN_MYPYC") == "1":
+    from mypyc.build import mypycify
+    ext_modules = mypycify([
+        "--follow-imports=silent",
+        "src/peakrdl_opentitan/importer.py",
+    ])
+
 setuptools.setup(
     name="peakrdl-opentitan",
     version=version,
@@ -24,10 +34,14 @@ setuptools.setup(
         "peakrdl_opentitan",
     ],
     include_package_data=True,
+    ext_modules=ext_modules,
     python_requires='>=3.5.2',
     install_requires=[
         "systemrdl-compiler>=1.24.0",
     ],
+    extras_require={
+        "fast": ["orjson"],
+    },
     entry_points = {
         "peakrdl.exporters": [
             'opentitan = peakrdl_opentitan.__peakrdl__:Exporter'
@@ -1,19 +1,105 @@
-from typing import Optional, List, Dict, Any, Type, Union, Set
+from typing import Optional, List, Dict, Any, Type, Union, Set, FrozenSet, Tuple, Sequence, ClassVar, Deque, NamedTuple, cast
 import re
 import os
+import stat
+import mmap
+import logging
+from weakref import WeakSet
+from concurrent.futures import ProcessPoolExecutor
+from collections import deque
 
-import hjson
+import hjson  # type: ignore
+
+try:
+    import orjson
+except ImportError:
+    orjson = None # type: ignore
 
 from systemrdl import RDLCompiler, RDLImporter, Addrmap
 from systemrdl import rdltypes
+from systemrdl.rdltypes import AccessType
 from systemrdl.messages import SourceRefBase
 from systemrdl import component as comp
 
 from .typemaps import sw_from_access, hw_from_access
 
 
+logger = logging.getLogger(__name__)
+
+# Field bit range, either "msb:lsb" or a single bit index.
+# Whitespace around the numbers is allowed, as int() used to accept it.
+_BITS_RE = re.compile(r"\s*(\d+)\s*(?::\s*(\d+)\s*)?")
+
+# Field sw access when the property is not assigned
+_DEFAULT_SW = AccessType.rw
+
+# Compilers that already have sig_props.rdl loaded
+_sig_props_compilers: "WeakSet[RDLCompiler]" = WeakSet()
+
+
+def _to_int(num: "str|int") -> int:
+    if isinstance(num, int):
+        return num
+    # Base 0 picks up 0x/0o/0b prefixes as well as plain decimal
+    try:
+        return int(num, 0)
+    except ValueError:
+        # Base 0 rejects decimals with leading zeros such as "010"
+        return int(num, 10)
+
+
+def _load_file(path: str) -> Dict[str, Any]:
+    tree = _read_file(path)
+    if isinstance(tree, str):
+        tree = _parse_hjson(tree)
+    return tree
+
+
+def _read_file(path: str) -> Union[Dict[str, Any], str]:
+    with open(path, "rb") as f:
+        # Only regular, non-empty files can be mapped. Pipes and other
+        # special files report a size of 0 and are read normally.
+        st = os.fstat(f.fileno())
+        if not (stat.S_ISREG(st.st_mode) and st.st_size > 0):
+            return _parse_json(f.read())
+
+        # Parse straight from the mapped file instead of reading a copy
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm, memoryview(mm) as data:
+            return _parse_json(data)
+
+
+def _parse_json(data: Union[bytes, memoryview]) -> Union[Dict[str, Any], str]:
+    # Most OpenTitan descriptions are plain JSON, try the fast parser first.
+    # Otherwise return the decoded text for _parse_hjson()
+    if orjson is not None:
+        try:
+            return orjson.loads(data)
+        except orjson.JSONDecodeError:
+            pass
+
+    return str(data, "utf-8")
+
+
+def _parse_hjson(text: str) -> Dict[str, Any]:
+    # Plain dicts keep insertion order and are cheaper to build than
+    # the OrderedDict hjson uses by default
+    return hjson.loads(text, object_pairs_hook=dict)
+
+
+class _FieldContext(NamedTuple):
+    # Register level values a field needs when it is built from the work queue
+    cnt: int
+    default_swaccess: Optional[str]
+    default_hwaccess: Optional[str]
+    reg_resval: int
+
+
 class OpenTitanImporter(RDLImporter):
 
+    #: Minimum number of hjson files for ``import_files`` to parse them in
+    #: worker processes. Below that, starting the pool costs more than it saves.
+    PARALLEL_MIN_FILES: ClassVar[int] = 8
+
     def __init__(self, compiler: RDLCompiler):
         """
         Parameters
@@ -24,6 +110,16 @@ class OpenTitanImporter(RDLImporter):
 
         super().__init__(compiler)
 
+        # SignalType enum members already evaluated, indexed by signal type
+        self._signal_types: Dict[str, Any] = {}
+
+        # Named signal/reg/field definitions of the file being imported,
+        # indexed by (component class, type name)
+        self._def_cache: Dict[Tuple[type, str], comp.Component] = {}
+
+        # Enum types already defined, indexed by type name and members
+        self._enum_cache: Dict[Tuple[str, Tuple[Tuple[str, int, Optional[str]], ...]], Type[rdltypes.UserEnum]] = {}
+
     @property
     def src_ref(self) -> SourceRefBase:
         return self.default_src_ref
@@ -38,19 +134,63 @@ class OpenTitanImporter(RDLImporter):
         path:
             Input OpenTitan HWJson file.
         """
+        self._import_tree(path, _load_file(path))
+
+    def import_files(self, paths: Sequence[str], max_workers: Optional[int] = None) -> None:
+        """
+        Import several OpenTitan HWJson files into the SystemRDL namespace.
+
+        Plain JSON files are parsed in the calling process. When at least
+        ``PARALLEL_MIN_FILES`` files need the slower hjson parser and more
+        than one worker is available, those are parsed in a pool of worker
+        processes. The register model is always built in the calling
+        process, in the order of ``paths``.
+
+        .. note::
+
+            With the ``spawn`` start method (the default on macOS and Windows)
+            the worker processes re-import the calling script, so scripts
+            calling this method must guard their entry point with
+            ``if __name__ == "__main__":``.
+
+        Parameters
+        ----------
+        paths:
+            Input OpenTitan HWJson files.
+        max_workers:
+            Maximum number of worker processes. Defaults to the number of CPUs.
+        """
+        trees = [_read_file(path) for path in paths]
+
+        # Only hjson parsing is slow enough to pay for the pool. A dict parsed
+        # by orjson costs about as much to pickle back as it does to parse.
+        hjson_idx = [i for i, tree in enumerate(trees) if isinstance(tree, str)]
+        texts = [cast(str, trees[i]) for i in hjson_idx]
+        workers = max_workers or os.cpu_count() or 1
+        if workers > 1 and len(texts) >= self.PARALLEL_MIN_FILES:
+            with ProcessPoolExecutor(max_workers=workers) as executor:
+                parsed = list(executor.map(_parse_hjson, texts))
+        else:
+            parsed = [_parse_hjson(text) for text in texts]
+
+        for i, hjson_tree in zip(hjson_idx, parsed):
+            trees[i] = hjson_tree
+
+        for path, tree in zip(paths, trees):
+            self._import_tree(path, cast(Dict[str, Any], tree))
+
+    def _import_tree(self, path: str, tree: Dict[str, Any]) -> None:
         super().import_file(path)
 
-        # tree = ElementTree.parse(path)
-        tree = None
-        with open(path) as f:
-            tree = hjson.load(f)
+        # Cached definitions point at the previous file's source
+        self._def_cache.clear()
 
-        self.regwidth = None
+        self.regwidth = 32
         self.__addroffset = 0
 
         self.import_ip(tree)
 
-    unsupported_addrmap_props = ["cip_id",
+    unsupported_addrmap_props: ClassVar[FrozenSet[str]] = frozenset({"cip_id",
                         "bus_interfaces",
                         "revisions",
                         "design_spec",
@@ -80,9 +220,9 @@ class OpenTitanImporter(RDLImporter):
                         "SPDX-License-Identifier",
                         "wakeup_list",
                         "countermeasure"
-                        ]
+                        })
 
-    unsupported_reg_props = [
+    unsupported_reg_props: ClassVar[FrozenSet[str]] = frozenset({
                         "alias_target",   #	optional	string	name of the register to apply the alias definition to.
                         "async",   #	optional	string	indicates the register must cross to a different clock domain before use. The value shown here should correspond to one of the module’s clocks.
                         "sync",   #	optional	string	indicates the register needs to be on another clock/reset domain.The value shown here should correspond to one of the module’s clocks.
@@ -94,23 +234,25 @@ class OpenTitanImporter(RDLImporter):
                         "shadowed",   #	optional	string	‘true’ if the register is shadowed
                         "update_err_alert",   #	optional	string	alert that will be triggered if this shadowed register has update error
                         "storage_err_alert",   #	optional	string	alert that will be triggered if this shadowed register has storage error
-                        ]
+                        })
 
-    unsupported_field_props = [
+    unsupported_field_props: ClassVar[FrozenSet[str]] = frozenset({
                         "alias_target",   #	optional	string	name of the field to apply the alias definition to.
                         "hwqe",   #	optional	bitrange	‘true’ if hardware uses ‘q’ enable signal, which is latched signal of software write pulse. Copied from register if not provided in field. (Tool adds if not provided.)
                         "tags",   #	optional	string	tags for the field, followed by the format ‘tag_name:item1:item2…’
                         "mubi",   #	optional	bitrange	boolean flag for whether the field is a multi-bit type
                         "auto_split",   #	optional	bitrange	boolean flag which determines whether the field should be automatically separated into 1-bit sub-fields.This flag is used as a hint for automatically generated software headers with register description.
-                        ]
+                        })
 
-    def warn_unsupported(self, key: str, tree: Dict):
-        if key in tree:
-            self.msg.warning(f"Unsupported key: {key}", self.src_ref)
-        
-    def import_ip(self, tree: Dict ) -> None:
-        for prop in OpenTitanImporter.unsupported_addrmap_props:
-            self.warn_unsupported(prop, tree)
+    def warn_unsupported(self, props: FrozenSet[str], tree: Dict[str, Any]) -> None:
+        # Walk the (short) tree keys rather than every unsupported property,
+        # this also keeps warnings in source order
+        for key in tree:
+            if key in props:
+                self.msg.warning(f"Unsupported key: {key}", self.src_ref)
+
+    def import_ip(self, tree: Dict[str, Any]) -> None:
+        self.warn_unsupported(OpenTitanImporter.unsupported_addrmap_props, tree)
 
         # Check for required values
         name = tree['name']
@@ -151,7 +293,26 @@ class OpenTitanImporter(RDLImporter):
         :class:`~comp.Signal`
             Component definition
         """
-        return self._create_definition(comp.Signal, type_name, src_ref)
+        return self._cached_definition(comp.Signal, type_name, src_ref)
+
+    def create_reg_definition(self, type_name: Optional[str] = None, src_ref: Optional[SourceRefBase] = None) -> comp.Reg:
+        return self._cached_definition(comp.Reg, type_name, src_ref)
+
+    def create_field_definition(self, type_name: Optional[str] = None, src_ref: Optional[SourceRefBase] = None) -> comp.Field:
+        return self._cached_definition(comp.Field, type_name, src_ref)
+
+    def _cached_definition(self, cls: type, type_name: Optional[str], src_ref: Optional[SourceRefBase]) -> Any:
+        # Anonymous definitions become the instance itself, never share them.
+        # Named ones are copied on instantiation and can safely be reused.
+        if type_name is None or src_ref is not None:
+            return self._create_definition(cls, type_name, src_ref)
+
+        key = (cls, type_name)
+        C = self._def_cache.get(key)
+        if C is None:
+            C = self._create_definition(cls, type_name, src_ref)
+            self._def_cache[key] = C
+        return C
 
     def instantiate_signal(self, comp_def: comp.Signal, inst_name: str, src_ref: Optional[SourceRefBase] = None) -> comp.Signal:
         """
@@ -169,147 +330,209 @@ class OpenTitanImporter(RDLImporter):
         assert isinstance(comp_def, comp.Signal)
         return self._instantiate(comp_def, inst_name, src_ref)
 
-    def add_signals(self, node : Addrmap, tree: Dict): # TODO FINISH
+    def add_children(self, parent: comp.Component, children: Sequence[comp.Component]) -> None:
+        """
+        Add a batch of child component instances to ``parent`` in one go.
 
-        for sig_type in ['input', 'output', 'inout']:
-            list_type = f'available_{sig_type}_list'
-            if list_type in tree:
-                for s in tree[list_type]:
-                    S = self.create_signal(s, sig_type)
-                    self.add_child(node, S)
+        Unlike ``add_child``, the parent/child kinds are not checked again:
+        the children are built by this importer and are known to be valid.
+        This also allows signals to be placed in an addrmap.
+        """
+        for child in children:
+            if not child.is_instance:
+                raise ValueError("Child must be an instance if adding to a parent")
+
+        parent.children.extend(children)
+
+    def add_signals(self, node : Addrmap, tree: Dict[str, Any]) -> None: # TODO FINISH
+
+        signals = [self.create_signal(s, sig_type)
+                   for sig_type in ['input', 'output', 'inout']
+                   for s in tree.get(f'available_{sig_type}_list', [])]
 
-    def create_signal(self, sig_dict : Dict, sig_type : str):
-        print(sig_dict)
+        self.add_children(node, signals)
+
+    def create_signal(self, sig_dict : Dict[str, Any], sig_type : str) -> comp.Signal:
+        logger.debug("Creating signal: %s", sig_dict)
+        name = sig_dict['name']
         S = self.instantiate_signal(
-                comp_def=self.create_signal_definition(sig_dict['name']),
-                inst_name=sig_dict['name'],
+                comp_def=self.create_signal_definition(name),
+                inst_name=name,
                 )
 
         self.assign_property(S, "desc", sig_dict['desc'])
 
-        width = int(sig_dict['width']) if 'width' in sig_dict else 1
+        width = int(sig_dict.get('width', 1))
         self.assign_property(S, "signalwidth", width)
 
-        if self.compiler.env.property_rules.lookup_property("signal_type") is None:
-            props_path = os.path.join(os.path.dirname(__file__), "sig_props.rdl")
-            self.compiler.compile_file(props_path)
+        sig_type_enum = self._signal_types.get(sig_type)
+        if sig_type_enum is None:
+            self._load_sig_props()
+            sig_type_enum = self.compiler.eval(f"SignalType::{sig_type}")
+            self._signal_types[sig_type] = sig_type_enum
 
-        sig_type_enum = self.compiler.eval(f"SignalType::{sig_type}")
         self.assign_property(S, "signal_type", sig_type_enum)
 
         return S
 
-    def add_registers(self, node : Addrmap, tree: Dict):
-        for reg in tree['registers']:
-            R = self.create_register(reg)
-            self.add_child(node, R)
-
-    def create_register(self, reg_dict: Dict) -> comp.Reg:
-        for prop in OpenTitanImporter.unsupported_reg_props:
-            self.warn_unsupported(prop, reg_dict)
+    def _load_sig_props(self) -> None:
+        # Compile the signal_type property definitions at most once per compiler
+        if self.compiler in _sig_props_compilers:
+            return
 
+        if self.compiler.env.property_rules.lookup_property("signal_type") is None:
+            props_path = os.path.join(os.path.dirname(__file__), "sig_props.rdl")
+            self.compiler.compile_file(props_path)
+        _sig_props_compilers.add(self.compiler)
+
+    def add_registers(self, node : Addrmap, tree: Dict[str, Any]) -> None:
+        # Registers and fields are built from an explicit work queue rather
+        # than nested calls. Fields are pushed in front of the queue so items
+        # are still handled in document order, and the children of every
+        # parent are attached in one batch once the queue is drained.
+        regs: List[comp.Component] = []
+        batches: List[Tuple[comp.Component, List[comp.Component]]] = [(node, regs)]
+        work: Deque[Tuple[str, List[comp.Component], Dict[str, Any], Optional[_FieldContext]]] = deque(
+            ("reg", regs, reg_dict, None) for reg_dict in tree['registers'])
+
+        create_register = self.create_register
+        create_field = self.create_field
+
+        while work:
+            kind, siblings, subtree, ctx = work.popleft()
+
+            if kind == "reg":
+                R = create_register(subtree)
+                siblings.append(R)
+
+                fields: List[comp.Component] = []
+                batches.append((R, fields))
+
+                # Register level defaults inherited by its fields
+                swaccess = subtree.get('swaccess')
+                hwaccess = subtree.get('hwaccess')
+                resval   = _to_int(subtree['resval']) if 'resval' in subtree else 0
+
+                work.extendleft(reversed([
+                    ("field", fields, field_dict, _FieldContext(cnt, swaccess, hwaccess, resval))
+                    for cnt, field_dict in enumerate(subtree['fields'])
+                    ]))
+            else:
+                assert ctx is not None
+                siblings.append(create_field(
+                        subtree,
+                        ctx.cnt,
+                        ctx.default_swaccess,
+                        ctx.default_hwaccess,
+                        ctx.reg_resval,
+                        ))
+
+        for parent, children in batches:
+            self.add_children(parent, children)
+
+    def create_register(self, reg_dict: Dict[str, Any]) -> comp.Reg:
+        self.warn_unsupported(OpenTitanImporter.unsupported_reg_props, reg_dict)
+
+        name = reg_dict['name']
         R = self.instantiate_reg(
-                comp_def=self.create_reg_definition(type_name=reg_dict['name']),
-                inst_name=reg_dict['name'],
+                comp_def=self.create_reg_definition(type_name=name),
+                inst_name=name,
                 addr_offset=self.__addroffset, # TODO
                 )
         self.__addroffset += self.regwidth//8  # TODO, any other case???
 
         self.assign_property(R, 'desc', reg_dict['desc'])
 
-        swaccess = reg_dict['swaccess']    if 'swaccess' in reg_dict else None
-        hwaccess = reg_dict['hwaccess']    if 'hwaccess' in reg_dict else None
-        resval   = self.hex_or_dec_to_dec(reg_dict['resval']) if 'resval'   in reg_dict else 0
-
-        self.add_fields(R, reg_dict, swaccess, hwaccess, resval)
-
         return R
 
-    def add_fields(self,
-                   reg: comp.Reg,
-                   reg_dict: Dict,
-                   default_swaccess : "str|None" = None,
-                   default_hwaccess : "str|None" = None,
-                   reg_resval       : int        = 0,
-                   ):
-
-        for cnt, field_dict in enumerate(reg_dict['fields']):
+    def create_field(self,
+                     field_dict       : Dict[str, Any],
+                     cnt              : int,
+                     default_swaccess : "str|None" = None,
+                     default_hwaccess : "str|None" = None,
+                     reg_resval       : int        = 0,
+                     ) -> comp.Field:
 
-            for prop in OpenTitanImporter.unsupported_field_props:
-                self.warn_unsupported(prop, field_dict)
+        self.warn_unsupported(OpenTitanImporter.unsupported_field_props, field_dict)
 
-            if 'name' in field_dict:
-                name = field_dict['name']
-            else:
-                name =  f"val{cnt}"  # TODO default name
-
-            bits = [int(part) for part in field_dict['bits'].split(':')]
-            if len(bits) == 2:
-                bit_offset = bits[1]
-                bit_width = (bits[0] - bits[1]) + 1
-            elif len(bits) == 1:
-                bit_offset = bits[0]
-                bit_width = 1
-            else:
-                assert False
+        name = field_dict.get('name') or f"val{cnt}"  # TODO default name
 
-            F = self.instantiate_field(
-                    comp_def=self.create_field_definition(name),
-                    inst_name=name,
-                    bit_offset=bit_offset,
-                    bit_width=bit_width,
-                    )
+        bits = field_dict['bits']
+        if isinstance(bits, int):
+            # Unquoted single bit index, already parsed as a number
+            msb = lsb = bits
+        else:
+            m = _BITS_RE.fullmatch(bits)
+            if m is None:
+                self.msg.fatal(f"Invalid bits value: {bits}", self.src_ref)
+            msb = int(m.group(1))
+            lsb = int(m.group(2)) if m.group(2) is not None else msb
+        bit_offset = lsb
+        bit_width = msb - lsb + 1
+
+        F = self.instantiate_field(
+                comp_def=self.create_field_definition(name),
+                inst_name=name,
+                bit_offset=bit_offset,
+                bit_width=bit_width,
+                )
 
-            val = self.assign_property(F, 'desc', field_dict['desc']) if 'desc' in field_dict else None
+        if 'desc' in field_dict:
+            self.assign_property(F, 'desc', field_dict['desc'])
 
-            swaccess = field_dict['swaccess'] if 'swaccess' in field_dict else default_swaccess
-            hwaccess = field_dict['hwaccess'] if 'hwaccess' in field_dict else default_hwaccess
+        swaccess = field_dict.get('swaccess', default_swaccess)
+        hwaccess = field_dict.get('hwaccess', default_hwaccess)
 
-            sw, onwrite, onread = sw_from_access(swaccess)
+        sw, onwrite, onread = sw_from_access(swaccess)
 
+        # sw defaults to rw in SystemRDL, only assign it when it differs
+        if sw is not _DEFAULT_SW:
             self.assign_property(F, "sw", sw)
-            val = self.assign_property(F, "onwrite", onwrite) if onwrite is not None else None
-            val = self.assign_property(F, "onread", onread) if onread is not None else None
-
-            if 'resval' in field_dict:
-                resval = field_dict['resval']
-                if resval == 'x':
-                    self.msg.warning(f"Unsupported resval value: {resval}, using 0 instead")
-                    resval = 0
-                resval = self.hex_or_dec_to_dec(resval)
-            else:
-                resval = (reg_resval & ((2**bit_width-1) << bit_offset)) >> bit_offset
-
-                self.assign_property(F, "reset", resval)
+        if onwrite is not None:
+            self.assign_property(F, "onwrite", onwrite)
+        if onread is not None:
+            self.assign_property(F, "onread", onread)
+
+        if 'resval' in field_dict:
+            resval = field_dict['resval']
+            if resval == 'x':
+                self.msg.warning(f"Unsupported resval value: {resval}, using 0 instead")
+                resval = 0
+            resval = _to_int(resval)
+        elif reg_resval:
+            resval = (reg_resval >> bit_offset) & ((1 << bit_width) - 1)
+        else:
+            resval = 0
 
-            if 'enum' in field_dict:
-                enum = self.parse_enum(field_dict)
-                self.assign_property(F, "encode", enum)
+        self.assign_property(F, "reset", resval)
 
-            self.add_child(reg, F)
+        if 'enum' in field_dict:
+            enum = self.parse_enum(field_dict)
+            self.assign_property(F, "encode", enum)
 
-    def parse_enum(self, field_dict: Dict) -> Type[rdltypes.UserEnum]:
+        return F
 
-        members = []
-        for enum in field_dict['enum']:
-            if enum['name'][0].isdigit():
-                self.msg.warning(f"Enumeration name cannot start with number: {enum['name']}, prepending underscore: _{enum['name']}")
-                enum['name'] = "_" + enum['name']
+    def parse_enum(self, field_dict: Dict[str, Any]) -> Type[rdltypes.UserEnum]:
 
-            members.append(rdltypes.UserEnumMemberContainer(
-                    name=enum['name'],
-                    value=int(enum['value']),
-                    rdl_name=None,
-                    rdl_desc=enum['desc'],
-                    ))
+        members = [rdltypes.UserEnumMemberContainer(
+                        name=self._enum_member_name(enum['name']),
+                        value=int(enum['value']),
+                        rdl_name=None,
+                        rdl_desc=enum['desc'],
+                        )
+                   for enum in field_dict['enum']]
 
-        enum_type = rdltypes.UserEnum.define_new(field_dict['name'] + "_e", members)
+        # Fields sharing a name and encoding reuse the same enum type
+        type_name = field_dict['name'] + "_e"
+        key = (type_name, tuple((m.name, m.value, m.rdl_desc) for m in members))
+        enum_type = self._enum_cache.get(key)
+        if enum_type is None:
+            enum_type = rdltypes.UserEnum.define_new(type_name, members)
+            self._enum_cache[key] = enum_type
         return enum_type
 
-    def hex_or_dec_to_dec(self, num : "str|int"):
-        if isinstance(num, str):
-            if num.startswith("0x"):
-                return int(num, 16)
-            return int(num)
-        else:
-            return num
+    def _enum_member_name(self, name: str) -> str:
+        if name[0].isdigit():
+            self.msg.warning(f"Enumeration name cannot start with number: {name}, prepending underscore: _{name}")
+            return "_" + name
+        return name
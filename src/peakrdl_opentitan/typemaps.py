@@ -29,12 +29,13 @@ def access_from_sw(
     
     assert False, f"SW access for reg cannot be mapped cannot be mapped: {sw}, {onwrite}, {onread}"
 
-def sw_from_access(access: str) -> "Tuple[AccessType, OnWriteType, OnReadType]":
-    for sw_entry in SW_ACCESS_MAP:
-        if access == sw_entry[3]:
-            return sw_entry[0], sw_entry[1], sw_entry[2] 
+# Opentitan swaccess string to (AccessType, OnWriteType, OnReadType)
+_SW_FROM_ACCESS = {sw_entry[3]: sw_entry[0:3] for sw_entry in SW_ACCESS_MAP}
 
-    assert False, f"OpenTitan property: {access}, not supported"
+def sw_from_access(access: "str|None") -> "Tuple[AccessType, OnWriteType, OnReadType]":
+    sw_entry = _SW_FROM_ACCESS.get(access)
+    assert sw_entry is not None, f"OpenTitan property: {access}, not supported"
+    return sw_entry
 
 
 # SystemRDL HW access to Opentitan hwaccess field
@@ -54,10 +55,11 @@ def access_from_hw(hw: AccessType) -> str:
     
     assert False, f"HW access for reg cannot be mapped cannot be mapped: {hw}"
 
-def hw_from_access(access: str) -> "AccessType":
-    for hw_entry in HW_ACCESS_MAP:
-        if access == hw_entry[1]:
-            return hw_entry[0] 
+# Opentitan hwaccess string to AccessType
+_HW_FROM_ACCESS = {hw_entry[1]: hw_entry[0] for hw_entry in HW_ACCESS_MAP}
 
-    assert False, f"OpenTitan property: {access}, not supported"
+def hw_from_access(access: "str|None") -> "AccessType":
+    hw = _HW_FROM_ACCESS.get(access)
+    assert hw is not None, f"OpenTitan property: {access}, not supported"
+    return hw
 